@@ -1,13 +1,28 @@
-from flask import Flask, render_template, jsonify, request, session
+from flask import Flask, Response, make_response, render_template, jsonify, request, session
 from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.memory import ConversationBufferWindowMemory
-from langchain.schema import BaseMessage, HumanMessage, AIMessage
+from langchain.memory import ConversationSummaryBufferMemory
+from langchain.schema import BaseMessage, HumanMessage, AIMessage, SystemMessage
+from langchain_core.messages import message_to_dict, messages_from_dict
 from langchain_pinecone import PineconeVectorStore
-from src.helper import download_hugging_face_embeddings
+try:
+    from pinecone.grpc import PineconeGRPC as Pinecone  # Multiplexed gRPC channel
+except ImportError:
+    from pinecone import Pinecone  # HTTP client with a pooled keep-alive session
+from src.helper import download_query_embeddings, needs_retrieval
 from dotenv import load_dotenv
+from cachetools import TTLCache
 from src.prompt import system_prompt
+from src.cache import CachedEmbeddings, QueryCache, make_cache_key
+from src.batching import RetrievalBatcher
+from src.hot_tier import HotDocumentTier
+import asyncio
+from functools import lru_cache
+import json
+import logging
 import os
+import redis
+import threading
 import uuid
 
 app = Flask(__name__)
@@ -15,9 +30,15 @@ app.secret_key = "healthcare_chatbot_secret_key"  # Required for sessions
 
 load_dotenv()
 
+# Per-request diagnostics go through logging; raise LOG_LEVEL to INFO/DEBUG to see them
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "WARNING").upper())
+logger = logging.getLogger(__name__)
+
 # Initialize Groq API
 GROQ_API_KEY = os.environ.get('GROQ_API_KEY')
 PINECONE_API_KEY = os.environ.get('PINECONE_API_KEY')
+REDIS_URL = os.environ.get('REDIS_URL')
+SESSION_TTL = 3600  # Seconds of inactivity before a session's history expires
 
 if GROQ_API_KEY:
     print("Using Groq API")
@@ -33,24 +54,70 @@ else:
     chatModel = None
     api_provider = "None"
 
-# Initialize Pinecone for RAG
-vectorstore = None
-if PINECONE_API_KEY:
+# Pinecone for RAG is initialized lazily on first use so importing the app
+# (e.g. by each gunicorn worker) doesn't load MiniLM or open connections
+@lru_cache(maxsize=1)
+def get_embeddings():
+    """Load the query embedding model once per process"""
+    return download_query_embeddings()
+
+@lru_cache(maxsize=1)
+def get_query_embeddings():
+    """Query embeddings with a cache, so repeated questions skip the forward pass"""
+    return CachedEmbeddings(get_embeddings(), maxsize=5000)
+
+@lru_cache(maxsize=1)
+def get_vectorstore():
+    """
+    Connect to the Pinecone index once per process, or None without RAG.
+    Errors propagate, so lru_cache doesn't cache a transient failure.
+    """
+    if not PINECONE_API_KEY:
+        return None
     try:
-        print("Initializing Pinecone vector store...")
+        logger.info("Initializing Pinecone vector store...")
         os.environ["PINECONE_API_KEY"] = PINECONE_API_KEY
-        embeddings = download_hugging_face_embeddings()
+        # Open one client and index connection and reuse it for every query
+        pc = Pinecone(api_key=PINECONE_API_KEY, pool_threads=30)
         vectorstore = PineconeVectorStore(
-            index_name="medical-chatbot",
-            embedding=embeddings
+            index=pc.Index("medical-chatbot"),
+            embedding=get_query_embeddings()
         )
-        print("✅ Pinecone vector store initialized successfully")
     except Exception as e:
-        print(f"⚠️ Warning: Could not initialize Pinecone: {e}")
-        vectorstore = None
-else:
+        logger.warning("⚠️ Could not initialize Pinecone, will retry on the next request: %s", e)
+        raise
+    logger.info("✅ Pinecone vector store initialized successfully")
+    return vectorstore
+
+@lru_cache(maxsize=1)
+def get_retrieval_batcher():
+    """
+    Coalesce concurrent queries into one embedding pass, answering
+    near-repeat queries from an in-memory tier before Pinecone
+    """
+    vectorstore = get_vectorstore()
+    if vectorstore is None:
+        return None
+    return RetrievalBatcher(
+        vectorstore,
+        get_query_embeddings(),
+        k=3,
+        hot_tier=hot_tier
+    )
+
+# lru_cache doesn't stop two threads initializing at once, so guard first use
+retriever_init_lock = threading.Lock()
+
+if not PINECONE_API_KEY:
     print("⚠️ No PINECONE_API_KEY found - running without RAG capabilities")
 
+# Near-repeat queries (cosine >= 0.95 to an earlier one) reuse that query's Pinecone results,
+# expiring after the same 300s as retrieval_cache so reindexed content shows up
+hot_tier = HotDocumentTier(dim=384, capacity=512, min_similarity=0.95, ttl=300)
+
+# Cache of retrieved context keyed by normalized question (skips embedding + Pinecone on hits)
+retrieval_cache = QueryCache(maxsize=1024, ttl=300)
+
 # Enhanced prompt with conversation context and RAG
 prompt = ChatPromptTemplate.from_messages([
     ("system", """You are a helpful medical assistant AI. You provide general medical information based on medical knowledge and always advise users to consult with healthcare professionals for specific medical advice.
@@ -69,18 +136,78 @@ Key guidelines:
     ("human", "{input}")
 ])
 
-# Dictionary to store memory for each session
-session_memories = {}
+# Compose the prompt and model once; the Groq SDK already retries transient
+# failures (ChatGroq max_retries=2), so no extra retry layer here
+chain = None
+if chatModel:
+    chain = prompt | chatModel
+
+# Session memory lives in Redis when REDIS_URL is set, so it is shared across
+# gunicorn workers and survives restarts. Without Redis we fall back to this
+# bounded in-process cache (single worker only), which evicts sessions after
+# SESSION_TTL seconds of inactivity so memory use stays constant.
+if REDIS_URL:
+    print("Using Redis for conversation memory")
+    # One client (and connection pool) shared by every request in this worker
+    redis_client = redis.Redis.from_url(REDIS_URL)
+else:
+    print("⚠️ No REDIS_URL found - conversation memory is kept in-process")
+    redis_client = None
+session_memories = TTLCache(maxsize=10000, ttl=SESSION_TTL)
+session_memories_lock = threading.Lock()  # TTLCache is not thread-safe
+
+def redis_history_key(session_id):
+    """Redis list holding a session's messages (same layout as RedisChatMessageHistory)"""
+    return f"message_store:{session_id}"
+
+def load_redis_messages(session_id):
+    """Read a session's messages from Redis, oldest first"""
+    items = redis_client.lrange(redis_history_key(session_id), 0, -1)
+    # Messages are pushed to the head of the list, so it is stored newest first
+    return messages_from_dict([json.loads(item) for item in reversed(items)])
+
+def create_memory():
+    """Create memory that keeps recent turns verbatim and summarizes older ones"""
+    return ConversationSummaryBufferMemory(
+        llm=chatModel,  # Groq writes the running summary
+        max_token_limit=2000,  # Token budget for verbatim recent messages (several full turns)
+        return_messages=True,
+        memory_key="chat_history"
+    )
 
 def get_memory_for_session(session_id):
     """Get or create memory for a specific session"""
-    if session_id not in session_memories:
-        session_memories[session_id] = ConversationBufferWindowMemory(
-            k=10,  # Remember last 10 exchanges
-            return_messages=True,
-            memory_key="chat_history"
-        )
-    return session_memories[session_id]
+    if REDIS_URL:
+        # The running summary is stored as a leading SystemMessage in Redis
+        memory = create_memory()
+        for message in load_redis_messages(session_id):
+            if isinstance(message, SystemMessage):
+                memory.moving_summary_buffer = message.content
+            else:
+                memory.chat_memory.add_message(message)
+        return memory
+    with session_memories_lock:
+        memory = session_memories.get(session_id)
+        if memory is None:
+            memory = create_memory()
+        session_memories[session_id] = memory  # Re-insert to refresh the TTL
+    return memory
+
+def save_memory_for_session(session_id, memory):
+    """Write the summary and remaining recent messages back to Redis"""
+    if not REDIS_URL:
+        return
+    messages = list(memory.chat_memory.messages)
+    if memory.moving_summary_buffer:
+        messages.insert(0, SystemMessage(content=memory.moving_summary_buffer))
+    key = redis_history_key(session_id)
+    # Replace the list atomically so concurrent readers never see it half-written
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.delete(key)
+    if messages:
+        pipe.lpush(key, *[json.dumps(message_to_dict(message)) for message in messages])
+        pipe.expire(key, SESSION_TTL)
+    pipe.execute()
 
 @app.route("/")
 def index():
@@ -89,95 +216,191 @@ def index():
         session['session_id'] = str(uuid.uuid4())
     return render_template('chat_with_memory.html')
 
-@app.route("/get", methods=["GET", "POST"])
-def chat():
-    if not chatModel:
-        return "No AI API configured. Please add GROQ_API_KEY to your .env file."
+def load_chat_history(session_id):
+    """Get the memory for a session along with its formatted chat history"""
+    memory = get_memory_for_session(session_id)
+    # Summary of older turns + recent messages
+    chat_history = memory.load_memory_variables({})["chat_history"]
+    return memory, chat_history
+
+def retrieve_context(msg):
+    """Get relevant context from Pinecone if available, using the retrieval cache"""
+    if not PINECONE_API_KEY:
+        return "No specific medical context available."
+    if not needs_retrieval(msg):
+        logger.info("⏭️ Skipping retrieval for small talk")
+        return "No specific medical context available."
+    try:
+        cache_key = make_cache_key(msg)
+        cached = retrieval_cache.get(cache_key)
+        if cached is not None:
+            context, docs_count = cached
+            logger.info("⚡ Using cached context (%d documents)", docs_count)
+            return context
+        with retriever_init_lock:
+            retrieval_batcher = get_retrieval_batcher()
+        if retrieval_batcher is None:
+            return "No specific medical context available."
+        docs = retrieval_batcher.search(msg)
+        context = "\n\n".join([doc.page_content for doc in docs])
+        retrieval_cache.put(cache_key, (context, len(docs)))
+        logger.info("✅ Retrieved %d relevant documents from Pinecone", len(docs))
+        return context
+    except Exception as e:
+        logger.warning("⚠️ Could not retrieve from Pinecone: %s", e)
+        return "No specific medical context available."
+
+async def prepare_chat(session_id, msg):
+    """Load memory and retrieve context concurrently, then build the chain inputs"""
+    # Both are blocking I/O, so run them in threads
+    (memory, chat_history), context = await asyncio.gather(
+        asyncio.to_thread(load_chat_history, session_id),
+        asyncio.to_thread(retrieve_context, msg)
+    )
+    
+    # Conversation history and context for the prompt
+    inputs = {
+        "chat_history": chat_history,
+        "context": context,
+        "input": msg
+    }
+    return memory, inputs
+
+def save_chat_turn(session_id, memory, msg, answer):
+    """Save the conversation to memory (older turns get folded into the summary)"""
+    try:
+        # Adds the turn, then asks Groq to summarize if over the token budget
+        memory.save_context({"input": msg}, {"output": answer})
+    except Exception as e:
+        # The turn is already stored verbatim; it gets summarized on a later turn
+        logger.warning("⚠️ Could not update conversation summary: %s", e)
+    try:
+        save_memory_for_session(session_id, memory)
+    except Exception as e:
+        logger.warning("⚠️ Could not save conversation memory: %s", e)
     
-    # Get session ID
+    logger.debug("Response: %s", answer)
+    logger.debug("Conversation history length: %d", len(memory.chat_memory.messages))
+
+def get_session_id():
+    """Get the session ID, creating one if it doesn't exist"""
     session_id = session.get('session_id', str(uuid.uuid4()))
     if 'session_id' not in session:
         session['session_id'] = session_id
+    return session_id
+
+def format_api_error(e):
+    """Turn an exception from the AI provider into a user-facing message"""
+    logger.error("Error: %s", e)
+    if "insufficient_quota" in str(e) or "429" in str(e):
+        return f"{api_provider} API quota exceeded. Please check your billing and usage."
+    elif "rate_limit" in str(e).lower():
+        return f"{api_provider} API rate limit exceeded. Please wait a moment and try again."
+    elif "api_key" in str(e).lower() or "authentication" in str(e).lower():
+        return f"{api_provider} API key is invalid. Please check your API key configuration."
+    else:
+        return f"Error with {api_provider}: {str(e)}"
+
+@app.route("/get", methods=["GET", "POST"])
+async def chat():
+    if not chatModel:
+        return "No AI API configured. Please add GROQ_API_KEY to your .env file."
+    
+    session_id = get_session_id()
     
     msg = request.form["msg"]
     input_text = msg
-    print(f"Session {session_id[:8]}... - User input: {input_text}")
-    print(f"Using {api_provider} API")
+    logger.info("Session %s... - User input: %s", session_id[:8], input_text)
     
     try:
-        # Get memory for this session
-        memory = get_memory_for_session(session_id)
-        
-        # Get conversation history
-        chat_history = memory.chat_memory.messages
+        memory, inputs = await prepare_chat(session_id, msg)
         
-        # Get relevant context from Pinecone if available
-        context = ""
-        if vectorstore:
-            try:
-                docs = vectorstore.similarity_search(msg, k=3)
-                context = "\n\n".join([doc.page_content for doc in docs])
-                print(f"✅ Retrieved {len(docs)} relevant documents from Pinecone")
-            except Exception as e:
-                print(f"⚠️ Warning: Could not retrieve from Pinecone: {e}")
-                context = "No specific medical context available."
-        else:
-            context = "No specific medical context available."
-        
-        # Format the prompt with conversation history and context
-        formatted_prompt = prompt.format_messages(
-            chat_history=chat_history,
-            context=context,
-            input=msg
-        )
-        
-        # Get response from the AI
-        response = chatModel.invoke(formatted_prompt)
-        answer = response.content
-        
-        # Save the conversation to memory
-        memory.chat_memory.add_user_message(msg)
-        memory.chat_memory.add_ai_message(answer)
-        
-        print(f"Response: {answer}")
-        print(f"Conversation history length: {len(chat_history) + 2}")  # +2 for the new messages
-        
-        return str(answer)
+        # Get response from the AI. Use the sync client in a thread: Flask runs
+        # each async view on a fresh event loop, and ChatGroq's shared AsyncGroq
+        # client keeps pooled connections bound to the previous (closed) loop
+        answer = (await asyncio.to_thread(chain.invoke, inputs)).content
         
     except Exception as e:
-        print(f"Error: {e}")
-        if "insufficient_quota" in str(e) or "429" in str(e):
-            return f"{api_provider} API quota exceeded. Please check your billing and usage."
-        elif "rate_limit" in str(e).lower():
-            return f"{api_provider} API rate limit exceeded. Please wait a moment and try again."
-        elif "api_key" in str(e).lower() or "authentication" in str(e).lower():
-            return f"{api_provider} API key is invalid. Please check your API key configuration."
-        else:
-            return f"Error with {api_provider}: {str(e)}"
+        return format_api_error(e)
+    
+    # Save (and possibly summarize) only after the answer has been sent
+    response = make_response(str(answer))
+    response.call_on_close(lambda: save_chat_turn(session_id, memory, msg, answer))
+    return response
+
+@app.route("/get_stream", methods=["POST"])
+def chat_stream():
+    """Stream the AI response as server-sent events, one event per token chunk"""
+    session_id = get_session_id()
+    
+    msg = request.form["msg"]
+    logger.info("Session %s... - User input (streaming): %s", session_id[:8], msg)
+    
+    def generate():
+        if not chatModel:
+            yield f"data: {json.dumps('No AI API configured. Please add GROQ_API_KEY to your .env file.')}\n\n"
+            yield "event: done\ndata: {}\n\n"
+            return
+        answer = ""
+        try:
+            memory, inputs = asyncio.run(prepare_chat(session_id, msg))
+            for chunk in chain.stream(inputs):
+                if not chunk.content:
+                    continue  # Groq's first and last chunks often carry no text
+                answer += chunk.content
+                # JSON-encode so newlines in the markdown don't break the SSE framing
+                yield f"data: {json.dumps(chunk.content)}\n\n"
+        except Exception as e:
+            yield f"data: {json.dumps(format_api_error(e))}\n\n"
+            yield "event: done\ndata: {}\n\n"
+            return
+        yield "event: done\ndata: {}\n\n"
+        # The client has the full answer by now; summarizing doesn't hold it up
+        save_chat_turn(session_id, memory, msg, answer)
+    
+    return Response(
+        generate(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.route("/clear", methods=["POST"])
 def clear_conversation():
     """Clear the conversation history for the current session"""
     session_id = session.get('session_id')
-    if session_id and session_id in session_memories:
-        del session_memories[session_id]
-        print(f"Cleared conversation history for session {session_id[:8]}...")
+    if session_id and REDIS_URL:
+        redis_client.delete(redis_history_key(session_id))
+        logger.info("Cleared conversation history for session %s...", session_id[:8])
+    elif session_id:
+        with session_memories_lock:
+            session_memories.pop(session_id, None)
+        logger.info("Cleared conversation history for session %s...", session_id[:8])
     return jsonify({"status": "cleared"})
 
 @app.route("/history", methods=["GET"])
 def get_history():
     """Get the conversation history for the current session"""
     session_id = session.get('session_id')
-    if session_id and session_id in session_memories:
-        memory = session_memories[session_id]
-        messages = []
-        for msg in memory.chat_memory.messages:
-            if isinstance(msg, HumanMessage):
-                messages.append({"type": "human", "content": msg.content})
-            elif isinstance(msg, AIMessage):
-                messages.append({"type": "ai", "content": msg.content})
-        return jsonify({"history": messages})
-    return jsonify({"history": []})
+    if session_id and REDIS_URL:
+        stored_messages = load_redis_messages(session_id)
+    else:
+        with session_memories_lock:
+            memory = session_memories.get(session_id) if session_id else None
+        stored_messages = memory.chat_memory.messages if memory else []
+    messages = []
+    for msg in stored_messages:
+        if isinstance(msg, HumanMessage):
+            messages.append({"type": "human", "content": msg.content})
+        elif isinstance(msg, AIMessage):
+            messages.append({"type": "ai", "content": msg.content})
+    return jsonify({"history": messages})
+
+@app.route("/cache_stats", methods=["GET"])
+def cache_stats():
+    """Get hit-rate statistics for the retrieval cache and hot document tier"""
+    stats = retrieval_cache.stats()
+    stats["hot_tier"] = hot_tier.stats()
+    return jsonify(stats)
 
 if __name__ == '__main__':
     print(f"Starting Healthcare Chatbot with {api_provider} API")
@@ -185,4 +408,6 @@ if __name__ == '__main__':
     print("- ✅ Conversation Memory (remembers context)")
     print("- ✅ Session-based conversations")
     print("- ✅ Medical assistance with context awareness")
-    app.run(host="0.0.0.0", port=8080, debug=True)
\ No newline at end of file
+    # Development server; in production run (use -w $(nproc) only with REDIS_URL set):
+    #   gunicorn -k gthread -w 1 --threads 8 -b 0.0.0.0:8080 app_with_memory:app
+    app.run(host="0.0.0.0", port=8080, debug=False, threaded=True)
\ No newline at end of file
@@ -3,10 +3,13 @@ Fresh PDF Processing Script for Healthcare Chatbot
 This script processes PDF files from scratch and creates a fresh Pinecone index
 """
 from dotenv import load_dotenv
+import itertools
 import os
-from src.helper import load_pdf_file, filter_to_minimal_docs, text_split, download_hugging_face_embeddings
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from src.helper import load_pdf_iter, filter_to_minimal_docs_iter, text_split_iter, download_hugging_face_embeddings, DeduplicatingEmbeddings
 from pinecone import Pinecone
-from pinecone import ServerlessSpec 
+from pinecone import ServerlessSpec
 from langchain_pinecone import PineconeVectorStore
 
 # Load environment variables
@@ -15,126 +18,166 @@ load_dotenv()
 PINECONE_API_KEY = os.environ.get('PINECONE_API_KEY')
 os.environ["PINECONE_API_KEY"] = PINECONE_API_KEY
 
-print("🚀 Starting Fresh PDF Processing...")
-print("=" * 50)
-
-# Step 1: Load PDF files
-print("📚 Step 1: Loading PDF files from data/ directory...")
-try:
-    extracted_data = load_pdf_file(data='data/')
-    print(f"✅ Successfully loaded {len(extracted_data)} documents")
-    
-    # Show some stats about the loaded documents
-    total_chars = sum(len(doc.page_content) for doc in extracted_data)
-    print(f"📊 Total characters: {total_chars:,}")
-    print(f"📄 Average characters per document: {total_chars // len(extracted_data):,}")
-except Exception as e:
-    print(f"❌ Error loading PDF files: {e}")
-    exit(1)
-
-# Step 2: Filter to minimal documents
-print("\n🔍 Step 2: Filtering to minimal documents...")
-try:
-    filter_data = filter_to_minimal_docs(extracted_data)
-    print(f"✅ Filtered to {len(filter_data)} clean documents")
-except Exception as e:
-    print(f"❌ Error filtering documents: {e}")
-    exit(1)
-
-# Step 3: Split into text chunks
-print("\n✂️ Step 3: Splitting text into chunks...")
-try:
-    text_chunks = text_split(filter_data)
-    print(f"✅ Created {len(text_chunks)} text chunks")
-    
-    # Show chunk statistics
-    chunk_sizes = [len(chunk.page_content) for chunk in text_chunks]
-    avg_chunk_size = sum(chunk_sizes) / len(chunk_sizes)
-    print(f"📊 Average chunk size: {avg_chunk_size:.0f} characters")
-    print(f"📊 Chunk size range: {min(chunk_sizes)} - {max(chunk_sizes)} characters")
-except Exception as e:
-    print(f"❌ Error splitting text: {e}")
-    exit(1)
-
-# Step 4: Initialize embeddings
-print("\n🧠 Step 4: Initializing HuggingFace embeddings...")
-try:
-    embeddings = download_hugging_face_embeddings()
-    print("✅ Successfully initialized sentence-transformers/all-MiniLM-L6-v2 embeddings")
-    print("📐 Embedding dimension: 384")
-except Exception as e:
-    print(f"❌ Error initializing embeddings: {e}")
-    exit(1)
-
-# Step 5: Connect to Pinecone and manage index
-print("\n🌲 Step 5: Managing Pinecone index...")
-try:
-    pc = Pinecone(api_key=PINECONE_API_KEY)
-    index_name = "medical-chatbot"
-    
-    # Check if index exists and delete it for fresh start
-    if pc.has_index(index_name):
-        print(f"🗑️ Deleting existing index '{index_name}' for fresh start...")
-        pc.delete_index(index_name)
-        print("✅ Existing index deleted")
-    
-    # Create fresh index
-    print(f"🆕 Creating fresh index '{index_name}'...")
-    pc.create_index(
-        name=index_name,
-        dimension=384,  # sentence-transformers/all-MiniLM-L6-v2 dimension
-        metric="cosine",
-        spec=ServerlessSpec(cloud="aws", region="us-east-1"),
-    )
-    print("✅ Fresh index created successfully")
-    
-except Exception as e:
-    print(f"❌ Error managing Pinecone index: {e}")
-    exit(1)
-
-# Step 6: Create and populate vector store
-print("\n📥 Step 6: Creating vector store and uploading embeddings...")
-try:
-    print("⏳ This may take a few minutes to process all chunks...")
-    
-    docsearch = PineconeVectorStore.from_documents(
-        documents=text_chunks,
-        index_name=index_name,
-        embedding=embeddings, 
-    )
-    
-    print("✅ Vector store created successfully!")
-    print(f"📊 Uploaded {len(text_chunks)} document chunks to Pinecone")
-    
-except Exception as e:
-    print(f"❌ Error creating vector store: {e}")
-    exit(1)
-
-# Step 7: Test the vector store
-print("\n🧪 Step 7: Testing vector store with sample query...")
-try:
-    test_query = "What are the symptoms of diabetes?"
-    results = docsearch.similarity_search(test_query, k=3)
-    
-    print(f"✅ Test query successful!")
-    print(f"📝 Query: '{test_query}'")
-    print(f"📊 Retrieved {len(results)} relevant documents")
-    
-    for i, result in enumerate(results, 1):
-        preview = result.page_content[:100].replace('\n', ' ')
-        print(f"  {i}. {preview}...")
-        
-except Exception as e:
-    print(f"❌ Error testing vector store: {e}")
-    exit(1)
-
-print("\n" + "=" * 50)
-print("🎉 FRESH PDF PROCESSING COMPLETED SUCCESSFULLY!")
-print("=" * 50)
-print("📋 Summary:")
-print(f"   • Processed: {len(extracted_data)} PDF pages")
-print(f"   • Created: {len(text_chunks)} text chunks")
-print(f"   • Index: '{index_name}' (fresh)")
-print(f"   • Embeddings: 384-dimensional vectors")
-print(f"   • Ready for: Healthcare chatbot with Groq API")
-print("\n🚀 You can now start the chatbot application!")
\ No newline at end of file
+
+# PDF parsing runs in spawned worker processes, which re-import this module,
+# so the pipeline only runs under the __main__ guard below
+def main():
+    print("🚀 Starting Fresh PDF Processing...")
+    print("=" * 50)
+
+    # Step 1: Initialize embeddings
+    print("🧠 Step 1: Initializing HuggingFace embeddings...")
+    try:
+        # Duplicate chunks (repeated headers, disclaimers) in a batch are embedded only once
+        embeddings = DeduplicatingEmbeddings(download_hugging_face_embeddings())
+        print("✅ Successfully initialized sentence-transformers/all-MiniLM-L6-v2 embeddings")
+        print(f"🖥️ Embedding device: {embeddings.embeddings.model_kwargs['device']}")
+        # One upload batch per encoder pass (256 on CUDA, 64 on CPU), rounded up to
+        # at least 128 so each batch still makes a reasonably sized Pinecone upsert
+        upload_batch_size = max(embeddings.embeddings.encode_kwargs["batch_size"], 128)
+        print(f"📦 Upload batch size: {upload_batch_size} chunks")
+        print("📐 Embedding dimension: 384")
+    except Exception as e:
+        print(f"❌ Error initializing embeddings: {e}")
+        sys.exit(1)
+
+    # Step 2: Parse the first batch before touching the live index
+    print("\n📚 Step 2: Loading PDF files from data/ directory...")
+    stats = {"pages": 0, "chars": 0}
+
+    def count_pages(docs):
+        """Track page statistics while documents stream past"""
+        for doc in docs:
+            stats["pages"] += 1
+            stats["chars"] += len(doc.page_content)
+            yield doc
+
+    try:
+        chunks = text_split_iter(filter_to_minimal_docs_iter(count_pages(load_pdf_iter(data='data/'))))
+        # A bad or empty data/ directory exits here, leaving the existing index intact
+        first_batch = list(itertools.islice(chunks, upload_batch_size))
+        if not first_batch:
+            raise ValueError("No text chunks were produced from data/")
+        print(f"✅ First {len(first_batch)} chunks ready")
+    except Exception as e:
+        print(f"❌ Error loading PDF files: {e}")
+        print("ℹ️ Existing Pinecone index was left untouched")
+        sys.exit(1)
+
+    # Step 3: Connect to Pinecone and manage index
+    print("\n🌲 Step 3: Managing Pinecone index...")
+    try:
+        pc = Pinecone(api_key=PINECONE_API_KEY)
+        index_name = "medical-chatbot"
+
+        # Check if index exists and delete it for fresh start
+        if pc.has_index(index_name):
+            print(f"🗑️ Deleting existing index '{index_name}' for fresh start...")
+            pc.delete_index(index_name)
+            print("✅ Existing index deleted")
+
+        # Create fresh index
+        print(f"🆕 Creating fresh index '{index_name}'...")
+        pc.create_index(
+            name=index_name,
+            dimension=384,  # sentence-transformers/all-MiniLM-L6-v2 dimension
+            metric="dotproduct",  # embeddings are L2-normalized, so dot product == cosine
+            spec=ServerlessSpec(cloud="aws", region="us-east-1"),
+        )
+        print("✅ Fresh index created successfully")
+
+        docsearch = PineconeVectorStore(
+            index_name=index_name,
+            embedding=embeddings,
+        )
+
+    except Exception as e:
+        print(f"❌ Error managing Pinecone index: {e}")
+        sys.exit(1)
+
+    # Step 4: Stream the remaining chunks through embed -> upload
+    print("\n📥 Step 4: Processing PDF files and uploading embeddings...")
+
+    def upload_batch(batch):
+        docsearch.add_documents(batch, batch_size=upload_batch_size)
+        return len(batch)
+
+    try:
+        print("⏳ This may take a few minutes to process all chunks...")
+
+        chunks = itertools.chain(first_batch, chunks)
+        chunk_count = 0
+        chunk_sizes_total = 0
+        min_chunk_size = None
+        max_chunk_size = 0
+        uploaded = 0
+
+        # Upload each batch in the background while the next one is parsed and split
+        with ThreadPoolExecutor(max_workers=1) as uploader:
+            pending = None
+            batch = []
+            for chunk in chunks:
+                size = len(chunk.page_content)
+                chunk_count += 1
+                chunk_sizes_total += size
+                min_chunk_size = size if min_chunk_size is None else min(min_chunk_size, size)
+                max_chunk_size = max(max_chunk_size, size)
+
+                batch.append(chunk)
+                if len(batch) == upload_batch_size:
+                    if pending:
+                        uploaded += pending.result()
+                        print(f"📤 Uploaded {uploaded} chunks so far...")
+                    pending = uploader.submit(upload_batch, batch)
+                    batch = []
+            if pending:
+                uploaded += pending.result()
+            if batch:
+                uploaded += upload_batch(batch)
+
+        print(f"✅ Loaded {stats['pages']} documents ({stats['chars']:,} characters)")
+        print(f"📄 Average characters per document: {stats['chars'] // max(stats['pages'], 1):,}")
+        print(f"✅ Created {chunk_count} text chunks")
+        print(f"📊 Average chunk size: {chunk_sizes_total / chunk_count:.0f} characters")
+        print(f"📊 Chunk size range: {min_chunk_size} - {max_chunk_size} characters")
+        print("✅ Vector store created successfully!")
+        print(f"📊 Uploaded {uploaded} document chunks to Pinecone")
+        print(f"♻️ Reused embeddings for {embeddings.duplicates} in-batch duplicate chunks")
+
+    except Exception as e:
+        print(f"❌ Error processing and uploading documents: {e}")
+        print(f"⚠️ Index '{index_name}' is only partially populated - fix the error and re-run this script")
+        sys.exit(1)
+
+    # Step 5: Test the vector store
+    print("\n🧪 Step 5: Testing vector store with sample query...")
+    try:
+        test_query = "What are the symptoms of diabetes?"
+        results = docsearch.similarity_search(test_query, k=3)
+
+        print(f"✅ Test query successful!")
+        print(f"📝 Query: '{test_query}'")
+        print(f"📊 Retrieved {len(results)} relevant documents")
+
+        for i, result in enumerate(results, 1):
+            preview = result.page_content[:100].replace('\n', ' ')
+            print(f"  {i}. {preview}...")
+
+    except Exception as e:
+        print(f"❌ Error testing vector store: {e}")
+        sys.exit(1)
+
+    print("\n" + "=" * 50)
+    print("🎉 FRESH PDF PROCESSING COMPLETED SUCCESSFULLY!")
+    print("=" * 50)
+    print("📋 Summary:")
+    print(f"   • Processed: {stats['pages']} PDF pages")
+    print(f"   • Created: {chunk_count} text chunks")
+    print(f"   • Index: '{index_name}' (fresh)")
+    print(f"   • Embeddings: 384-dimensional vectors")
+    print(f"   • Ready for: Healthcare chatbot with Groq API")
+    print("\n🚀 You can now start the chatbot application!")
+
+
+if __name__ == "__main__":
+    main()
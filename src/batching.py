@@ -0,0 +1,107 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class RetrievalBatcher:
+    """
+    Coalesce concurrent similarity searches into micro-batches.
+
+    Queries arriving within `max_wait` seconds of each other (up to
+    `max_batch_size`) are embedded together in a single forward pass, and
+    their Pinecone lookups are then issued concurrently over the client's
+    connection pool instead of one request thread at a time.
+
+    If a `hot_tier` is given, it is checked before Pinecone and fed with each
+    query vector and the documents Pinecone returned for it.
+    """
+
+    def __init__(self, vectorstore, embeddings, k=3, max_batch_size=16, max_wait=0.01, hot_tier=None, timeout=30):
+        self.vectorstore = vectorstore
+        self.embeddings = embeddings
+        self.hot_tier = hot_tier
+        self.k = k
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=max_batch_size)
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def search(self, query):
+        """
+        Return the top-k documents for query, blocking until its batch is served.
+        Raises concurrent.futures.TimeoutError if no answer arrives within `timeout` seconds.
+        """
+        self._ensure_started()
+        future = Future()
+        self._queue.put((query, future))
+        return future.result(timeout=self.timeout)
+
+    def _ensure_started(self):
+        # Start the collector lazily so it is created in the serving process
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._collect, daemon=True)
+                self._worker.start()
+
+    def _collect(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._flush(batch)
+            except Exception as e:
+                # Never let the collector die with callers still waiting
+                logger.exception("⚠️ Retrieval batch failed")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _flush(self, batch):
+        try:
+            vectors = self.embeddings.embed_documents([query for query, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for (_, future), vector in zip(batch, vectors):
+            if self.hot_tier is not None:
+                try:
+                    docs = self.hot_tier.search(vector, k=self.k)
+                except Exception as e:
+                    logger.warning("⚠️ Hot document tier lookup failed, using Pinecone: %s", e)
+                    docs = None
+                if docs is not None:
+                    logger.info("⚡ Served query from hot document tier")
+                    future.set_result(docs)
+                    continue
+            self._pool.submit(self._search_by_vector, vector, future)
+
+    def _search_by_vector(self, vector, future):
+        try:
+            docs = self.vectorstore.similarity_search_by_vector(vector, k=self.k)
+        except Exception as e:
+            future.set_exception(e)
+            return
+        future.set_result(docs)
+        if self.hot_tier is not None:
+            # Remember the answer so near-repeat queries can reuse it
+            try:
+                self.hot_tier.add(vector, docs)
+            except Exception as e:
+                logger.warning("⚠️ Could not update hot document tier: %s", e)
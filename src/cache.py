@@ -0,0 +1,120 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import List
+
+from cachetools import LRUCache
+from langchain_core.embeddings import Embeddings
+
+
+def make_cache_key(text):
+    """Build a cache key from a user message, ignoring case and surrounding whitespace."""
+    return hashlib.sha1(text.strip().lower().encode()).hexdigest()
+
+
+class QueryCache:
+    """
+    Thread-safe LRU cache with a per-entry TTL.
+
+    Used to remember the Pinecone context retrieved for a question so that
+    repeated questions skip both the query embedding and the network call.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return the cached value for key, or None if missing or expired."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Store value under key, evicting the least recently used entries if full."""
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            self.evict()
+
+    def evict(self):
+        """Drop expired entries and trim the cache down to maxsize."""
+        with self._lock:
+            now = time.monotonic()
+            for key in [k for k, (_, expires_at) in self._data.items() if expires_at < now]:
+                del self._data[key]
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """Return size and hit-rate counters for monitoring."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wrap an embedding model with a bounded LRU cache of query vectors.
+
+    Keys are normalized with make_cache_key; all-MiniLM-L6-v2 lowercases its
+    input anyway, so normalization does not change the resulting vector.
+    5000 cached 384-dim vectors take roughly 8MB.
+    """
+
+    def __init__(self, embeddings: Embeddings, maxsize=5000):
+        self.embeddings = embeddings
+        self._cache = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [make_cache_key(text) for text in texts]
+        with self._lock:
+            vectors = {key: self._cache[key] for key in keys if key in self._cache}
+        pending = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                pending.setdefault(key, text)
+        if pending:
+            new_vectors = self.embeddings.embed_documents(list(pending.values()))
+            with self._lock:
+                for key, vector in zip(pending.keys(), new_vectors):
+                    self._cache[key] = vector
+                    vectors[key] = vector
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = make_cache_key(text)
+        with self._lock:
+            if key in self._cache:
+                return self._cache[key]
+        vector = self.embeddings.embed_query(text)
+        with self._lock:
+            self._cache[key] = vector
+        return vector
\ No newline at end of file
@@ -1,19 +1,58 @@
-from langchain_community.document_loaders import PyPDFLoader, DirectoryLoader
+from langchain_community.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_huggingface import HuggingFaceEmbeddings
-from typing import List
+from langchain_core.embeddings import Embeddings
+from typing import Iterable, Iterator, List
 from langchain.schema import Document
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import glob
+import itertools
+import hashlib
+import logging
+import multiprocessing
+import os
+import re
+
+logger = logging.getLogger(__name__)
 
 
 #Extract Data From the PDF File
 def load_pdf_file(data):
-    loader= DirectoryLoader(data,
-                            glob="*.pdf",
-                            loader_cls=PyPDFLoader)
+    return list(load_pdf_iter(data))
+
+
+
+#Extract the pages of a single PDF file (module-level so worker processes can run it)
+def load_single_pdf(path):
+    return PyPDFLoader(path).load()
+
+
 
-    documents=loader.load()
+#Lazily extract pages from the PDF files, parsing several files in parallel
+def load_pdf_iter(data, max_workers=None) -> Iterator[Document]:
+    pdf_paths=sorted(glob.glob(os.path.join(data, "*.pdf")))
 
-    return documents
+    #A single file gains nothing from a worker process
+    if len(pdf_paths) < 2:
+        for path in pdf_paths:
+            yield from PyPDFLoader(path).lazy_load()
+        return
+
+    #Parsing is CPU-bound, so use processes; spawn so workers never inherit torch/CUDA
+    #state from the caller (scripts calling this need an `if __name__ == "__main__":` guard)
+    max_workers=min(max_workers or os.cpu_count(), len(pdf_paths))
+    with ProcessPoolExecutor(max_workers=max_workers,
+                             mp_context=multiprocessing.get_context("spawn")) as executor:
+        #Keep only max_workers files in flight so parsed pages can't pile up ahead of the consumer
+        paths=iter(pdf_paths)
+        in_flight=deque(executor.submit(load_single_pdf, path) for path in itertools.islice(paths, max_workers))
+        while in_flight:
+            documents=in_flight.popleft().result()
+            next_path=next(paths, None)
+            if next_path is not None:
+                in_flight.append(executor.submit(load_single_pdf, next_path))
+            yield from documents
 
 
 
@@ -22,28 +61,155 @@ def filter_to_minimal_docs(docs: List[Document]) -> List[Document]:
     Given a list of Document objects, return a new list of Document objects
     containing only 'source' in metadata and the original page_content.
     """
-    minimal_docs: List[Document] = []
+    return list(filter_to_minimal_docs_iter(docs))
+
+
+
+def filter_to_minimal_docs_iter(docs: Iterable[Document]) -> Iterator[Document]:
+    """
+    Streaming version of filter_to_minimal_docs: yields each minimal
+    Document as soon as its source Document is available.
+    """
     for doc in docs:
         src = doc.metadata.get("source")
-        minimal_docs.append(
-            Document(
-                page_content=doc.page_content,
-                metadata={"source": src}
-            )
+        yield Document(
+            page_content=doc.page_content,
+            metadata={"source": src}
         )
-    return minimal_docs
 
 
 
 #Split the Data into Text Chunks
 def text_split(extracted_data):
+    return list(text_split_iter(extracted_data))
+
+
+
+#Split Documents into Text Chunks as they arrive
+def text_split_iter(extracted_data: Iterable[Document]) -> Iterator[Document]:
     text_splitter=RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=20)
-    text_chunks=text_splitter.split_documents(extracted_data)
-    return text_chunks
+    for doc in extracted_data:
+        yield from text_splitter.split_documents([doc])
 
 
 
-#Download the Embeddings from HuggingFace 
+#Download the Embeddings from HuggingFace (on the GPU in FP16 when one is available)
 def download_hugging_face_embeddings():
-    embeddings=HuggingFaceEmbeddings(model_name='sentence-transformers/all-MiniLM-L6-v2')  #this model return 384 dimensions
-    return embeddings
\ No newline at end of file
+    import torch
+
+    if torch.cuda.is_available():
+        model_kwargs={"device": "cuda", "model_kwargs": {"torch_dtype": torch.float16}}
+        batch_size=256  #large batches keep the GPU busy
+    else:
+        model_kwargs={"device": "cpu"}
+        batch_size=64
+
+    embeddings=HuggingFaceEmbeddings(
+        model_name='sentence-transformers/all-MiniLM-L6-v2',  #this model return 384 dimensions
+        model_kwargs=model_kwargs,
+        encode_kwargs={"batch_size": batch_size, "normalize_embeddings": True}  #embed many chunks per pass; unit vectors for dotproduct index
+    )
+    return embeddings
+
+
+
+#Dynamically quantized int8 export of the index model, shipped in its HuggingFace repo
+QUERY_MODEL_INT8='sentence-transformers/all-MiniLM-L6-v2-int8'
+QUERY_MODEL_INT8_FILE='onnx/model_quint8_avx2.onnx'  #runs on any AVX2 CPU
+
+
+
+#Register the int8 MiniLM export with FastEmbed, returning False if this FastEmbed can't load custom models
+def register_int8_query_model():
+    try:
+        from fastembed import TextEmbedding
+        from fastembed.common.model_description import ModelSource, PoolingType
+    except ImportError:
+        return False
+    if not hasattr(TextEmbedding, "add_custom_model"):
+        return False
+    try:
+        TextEmbedding.add_custom_model(
+            model=QUERY_MODEL_INT8,
+            pooling=PoolingType.MEAN,
+            normalization=True,
+            sources=ModelSource(hf='sentence-transformers/all-MiniLM-L6-v2'),
+            dim=384,
+            model_file=QUERY_MODEL_INT8_FILE
+        )
+    except ValueError:
+        pass  #already registered in this process
+    return True
+
+
+
+#Faster CPU embeddings for per-request queries (same model, int8 ONNX Runtime)
+def download_query_embeddings():
+    try:
+        from langchain_community.embeddings import FastEmbedEmbeddings
+    except ImportError:
+        return download_hugging_face_embeddings()  #fastembed not installed, fall back to PyTorch
+
+    threads=os.environ.get("EMBEDDING_THREADS")  #cap ONNX Runtime threads when running several workers
+    if register_int8_query_model():
+        model_name=QUERY_MODEL_INT8  #int8 weights; vectors stay in the FP32 index's space up to quantization error
+    else:
+        logger.warning("⚠️ FastEmbed cannot load the int8 export - using the FP32 ONNX model")
+        model_name='sentence-transformers/all-MiniLM-L6-v2'
+    embeddings=FastEmbedEmbeddings(
+        model_name=model_name,  #same 384-dim space as the index
+        threads=int(threads) if threads else None
+    )
+    return embeddings
+
+
+
+#Small talk that never benefits from a vector search
+CHIT_CHAT_WORDS = {
+    "hi", "hello", "hey", "thanks", "thank", "you", "ok", "okay", "bye",
+    "goodbye", "yes", "no", "sure", "cool", "great", "good", "morning",
+    "evening", "night", "please", "can", "repeat", "that", "again", "got", "it",
+}
+
+
+def needs_retrieval(msg: str) -> bool:
+    """
+    Cheap check for whether a message should be sent to the vector store.
+    Returns False for messages without letters (in any script) and for short
+    messages made up entirely of English greetings / acknowledgements
+    (e.g. "hi", "thanks!", "ok"); anything else, including non-Latin text,
+    is retrieved for.
+    """
+    words = re.findall(r"[^\W\d_]+", msg.lower())  # Runs of Unicode letters
+    if not words:
+        return False
+    if len(words) < 6 and all(word in CHIT_CHAT_WORDS for word in words):
+        return False
+    return True
+
+
+class DeduplicatingEmbeddings(Embeddings):
+    """
+    Wrap an embedding model so identical texts within one batch are only
+    embedded once.
+
+    Each embed_documents call (one upload batch) is deduplicated by content
+    hash and the shared vector is fanned back out to every duplicate. Nothing
+    is kept between calls, so memory stays bounded by the batch size.
+    """
+
+    def __init__(self, embeddings: Embeddings):
+        self.embeddings = embeddings
+        self.duplicates = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [hashlib.sha1(text.encode()).hexdigest() for text in texts]
+        unique = {}
+        for key, text in zip(keys, texts):
+            unique.setdefault(key, text)
+        self.duplicates += len(texts) - len(unique)
+        vectors = dict(zip(unique.keys(), self.embeddings.embed_documents(list(unique.values()))))
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
@@ -0,0 +1,89 @@
+import threading
+import time
+
+import numpy as np
+
+
+class HotDocumentTier:
+    """
+    In-process tier of recent query vectors and the documents Pinecone
+    returned for them.
+
+    Query vectors are kept as rows of a contiguous (capacity, dim) float32
+    matrix, so a new query is compared against every hot query with a single
+    `matrix @ query` call. When the closest one reaches `min_similarity`, the
+    new query is a near-repeat (rephrasing, typo) and gets exactly the
+    documents Pinecone returned for it; otherwise the caller falls through to
+    Pinecone. Entries expire `ttl` seconds after they were added, so a
+    reindex is picked up; expired rows are reused first, then rows are
+    recycled in LRU order.
+    """
+
+    def __init__(self, dim=384, capacity=512, min_similarity=0.95, ttl=300):
+        self.capacity = capacity
+        self.min_similarity = min_similarity
+        self.ttl = ttl
+        self._matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self._docs = [None] * capacity
+        self._last_used = np.zeros(capacity, dtype=np.int64)
+        self._expires_at = np.zeros(capacity, dtype=np.float64)
+        self._size = 0
+        self._clock = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def search(self, vector, k=3):
+        """Return the documents cached for a near-identical earlier query, or None on a miss."""
+        query = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            if self._size:
+                scores = self._matrix[:self._size] @ query
+                scores[self._expires_at[:self._size] < time.monotonic()] = -np.inf
+                row = int(np.argmax(scores))
+                docs = self._docs[row]
+                if scores[row] >= self.min_similarity and len(docs) >= k:
+                    self._touch(row)
+                    self.hits += 1
+                    return docs[:k]
+            self.misses += 1
+            return None
+
+    def add(self, vector, docs):
+        """Remember the documents Pinecone returned for a query vector."""
+        with self._lock:
+            now = time.monotonic()
+            if self._size < self.capacity:
+                row = self._size
+                self._size += 1
+            else:
+                expired = np.flatnonzero(self._expires_at < now)
+                row = int(expired[0]) if expired.size else int(np.argmin(self._last_used))
+            self._matrix[row] = np.asarray(vector, dtype=np.float32)
+            self._docs[row] = list(docs)
+            self._expires_at[row] = now + self.ttl
+            self._touch(row)
+
+    def clear(self):
+        """Forget every hot query, e.g. after the index has been rebuilt."""
+        with self._lock:
+            self._docs = [None] * self.capacity
+            self._size = 0
+
+    def _touch(self, row):
+        self._clock += 1
+        self._last_used[row] = self._clock
+
+    def stats(self):
+        """Return size and hit-rate counters for monitoring."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": self._size,
+                "capacity": self.capacity,
+                "min_similarity": self.min_similarity,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
@@ -13,32 +13,39 @@ PINECONE_API_KEY=os.environ.get('PINECONE_API_KEY')
 os.environ["PINECONE_API_KEY"] = PINECONE_API_KEY
 
 
-extracted_data=load_pdf_file(data='data/')
-filter_data = filter_to_minimal_docs(extracted_data)
-text_chunks=text_split(filter_data)
+#load_pdf_file parses PDFs in spawned worker processes, which re-import this script
+def main():
+    extracted_data=load_pdf_file(data='data/')
+    filter_data = filter_to_minimal_docs(extracted_data)
+    text_chunks=text_split(filter_data)
 
-embeddings = download_hugging_face_embeddings()
+    embeddings = download_hugging_face_embeddings()
 
-pinecone_api_key = PINECONE_API_KEY
-pc = Pinecone(api_key=pinecone_api_key)
+    pinecone_api_key = PINECONE_API_KEY
+    pc = Pinecone(api_key=pinecone_api_key)
 
 
 
-index_name = "medical-chatbot"  # change if desired
+    index_name = "medical-chatbot"  # change if desired
 
-if not pc.has_index(index_name):
-    pc.create_index(
-        name=index_name,
-        dimension=384,
-        metric="cosine",
-        spec=ServerlessSpec(cloud="aws", region="us-east-1"),
-    )
+    if not pc.has_index(index_name):
+        pc.create_index(
+            name=index_name,
+            dimension=384,
+            metric="dotproduct",  # embeddings are L2-normalized, so dot product == cosine
+            spec=ServerlessSpec(cloud="aws", region="us-east-1"),
+        )
+
+    index = pc.Index(index_name)
 
-index = pc.Index(index_name)
+
+    docsearch = PineconeVectorStore.from_documents(
+        documents=text_chunks,
+        index_name=index_name,
+        embedding=embeddings,
+        batch_size=128,
+    )
 
 
-docsearch = PineconeVectorStore.from_documents(
-    documents=text_chunks,
-    index_name=index_name,
-    embedding=embeddings, 
-)
\ No newline at end of file
+if __name__ == "__main__":
+    main()